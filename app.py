@@ -25,13 +25,14 @@ Okay, this is an ambitious request for a full, copy-pastable code, as it involve
 Create a file named `requirements.txt` in your Replit project and paste the following:
 
 ```
-streamlit
-pandas
+streamlit>=1.50
+pandas>=2.2
 plotly
 sqlalchemy
 bcrypt
 streamlit-authenticator
-openpyxl
+python-calamine
+xlsxwriter
 ```
 
 ---
@@ -104,6 +105,16 @@ h3 {
     color: #2980b9; /* A professional blue */
 }
 
+.kpi-card .kpi-value {
+    font-size: 2.2em;
+    font-weight: 700;
+    color: #2980b9;
+}
+
+.kpi-card .kpi-value.alert {
+    color: #e74c3c; /* Red for counts that need attention */
+}
+
 /* Streamlit specific elements */
 .stTabs [data-testid="stTabItem"] {
     font-size: 1.1em;
@@ -251,14 +262,18 @@ Create a file named `app.py` in your Replit project and paste the following:
 ```python
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, event, select, func, text, Column, Integer, String, Float, DateTime, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from sqlalchemy.exc import IntegrityError
-import datetime
+from contextlib import contextmanager
 import io
+import math
+import hashlib
 import bcrypt
+import xlsxwriter
 import streamlit_authenticator as stauth
 from pathlib import Path
 
@@ -267,7 +282,14 @@ DATABASE_URL = "sqlite:///inventory_dashboard.db"
 LOW_STOCK_THRESHOLD = 10
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "admin" # Change this in a real application!
+BCRYPT_ROUNDS = 10 # bcrypt's default is 12; each step down halves hashing/verification time
 DEFAULT_LOCATIONS = ["Warehouse A", "Warehouse B", "Shelf 1", "Shelf 2"]
+MAX_CHART_POINTS = 2000 # Upper bound on points sent to the browser per line series
+MAX_LOW_STOCK_ROWS = 200 # Lowest-stock items loaded for the low-stock alert table and chart
+INVENTORY_PAGE_SIZE = 50 # Rows shown per page in the inventory table
+INVENTORY_DISPLAY_COLUMNS = ['sku', 'description', 'qty_available', 'location', 'last_updated'] # Inventory table columns, before Status
+UPLOAD_COLUMNS = ['SKU', 'Description', 'QTYAVAILABLE', 'Location'] # Required Excel upload headers
+LOGS_PAGE_SIZE = 100 # Log entries shown per page
 
 # --- Page Config ---
 st.set_page_config(
@@ -278,18 +300,66 @@ st.set_page_config(
 )
 
 # --- Load Custom CSS ---
+@st.cache_data # Read from disk once per process
+def load_css(path="styles.css"):
+    return Path(path).read_text()
+
 try:
-    with open("styles.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 except FileNotFoundError:
     st.warning("`styles.css` not found. Dashboard styling might be basic. Please create `styles.css`.")
 
 # --- Database Setup (SQLAlchemy) ---
 Base = declarative_base()
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets dashboard reads run alongside log/transaction writes without an fsync per commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536") # 64 MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456") # 256 MB memory-mapped I/O
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+@st.cache_resource # One engine for the whole server process, not one per rerun
+def get_engine():
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False}, # Streamlit serves sessions from multiple threads
+        pool_pre_ping=True
+    )
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+@st.cache_resource # The thread-local session registry must outlive individual reruns too
+def get_session_factory():
+    return scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=get_engine(), expire_on_commit=False))
+
+engine = get_engine()
+SessionLocal = get_session_factory()
+
+@contextmanager
+def session_scope():
+    # Nested scopes join the enclosing transaction so related writes commit together
+    if SessionLocal.registry.has():
+        yield SessionLocal()
+        return
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        SessionLocal.remove()
 
 # --- Database Models ---
+# Timestamps are stamped by SQLite in local time (matching the previous datetime.now defaults)
+LOCAL_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
@@ -310,44 +380,70 @@ class Inventory(Base):
     description = Column(String)
     qty_available = Column(Float, default=0)
     location = Column(String)
-    last_updated = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    last_updated = Column(DateTime, server_default=text(f"({LOCAL_NOW_SQL})"), onupdate=func.strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
 
     user = relationship('User', back_populates='inventories')
     __table_args__ = (
-        st.UniqueConstraint('user_id', 'sku', name='_user_sku_uc'), # Ensure SKU is unique per user
+        UniqueConstraint('user_id', 'sku', name='_user_sku_uc'), # Ensure SKU is unique per user
+        Index('ix_inv_user_qty', 'user_id', 'qty_available'), # Low-stock KPI and top-N queries
+        Index('ix_inv_user_loc', 'user_id', 'location'), # Location grouping
     )
 
 class Log(Base):
     __tablename__ = 'logs'
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    timestamp = Column(DateTime, default=datetime.datetime.now)
+    timestamp = Column(DateTime, server_default=text(f"({LOCAL_NOW_SQL})"))
     action = Column(String, nullable=False) # e.g., 'ADD', 'EDIT', 'DELETE', 'UPLOAD'
     sku = Column(String) # SKU affected
     details = Column(Text) # JSON string of old/new values or other relevant info
 
     user = relationship('User', back_populates='logs')
 
+    __table_args__ = (
+        Index('ix_log_user_ts', 'user_id', 'timestamp'), # Paged log reads, newest first
+    )
+
 class Transaction(Base):
     __tablename__ = 'transactions'
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     sku = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.datetime.now)
+    timestamp = Column(DateTime, server_default=text(f"({LOCAL_NOW_SQL})"))
     type = Column(String, nullable=False) # 'IN' (increase), 'OUT' (decrease)
     quantity_change = Column(Float, nullable=False) # Absolute change
     current_qty = Column(Float, nullable=False) # Quantity after transaction
 
     user = relationship('User', back_populates='transactions')
 
+    __table_args__ = (
+        Index('ix_tx_user_sku_ts', 'user_id', 'sku', 'timestamp'), # Per-SKU trends, SKU list and monthly totals
+    )
+
 # --- Database Initialization and CRUD ---
+def hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
 def init_db():
+    # Returns an (st function, message) notice about admin seeding, or None if nothing happened
     Base.metadata.create_all(bind=engine)
-    db = SessionLocal()
+    # create_all skips tables that already exist, so add any newer indexes to existing databases
+    for index in (*Inventory.__table__.indexes, *Log.__table__.indexes, *Transaction.__table__.indexes):
+        index.create(bind=engine, checkfirst=True)
+    # Tables created before the DB-side defaults have no column DEFAULT; stamp their new rows with a trigger
+    with engine.begin() as conn:
+        for table, column in (('inventory', 'last_updated'), ('logs', 'timestamp'), ('transactions', 'timestamp')):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_default AFTER INSERT ON {table} "
+                f"WHEN NEW.{column} IS NULL BEGIN "
+                f"UPDATE {table} SET {column} = {LOCAL_NOW_SQL} WHERE id = NEW.id; END"
+            ))
     try:
-        # Create default admin user if not exists
-        if not db.query(User).filter_by(username=ADMIN_USERNAME).first():
-            hashed_password = bcrypt.hashpw(ADMIN_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        with session_scope() as db:
+            # Create default admin user if not exists
+            if db.query(User).filter_by(username=ADMIN_USERNAME).first():
+                return None
+            hashed_password = hash_password(ADMIN_PASSWORD)
             admin_user = User(
                 username=ADMIN_USERNAME,
                 password_hash=hashed_password,
@@ -356,101 +452,196 @@ def init_db():
                 role="admin"
             )
             db.add(admin_user)
-            db.commit()
-            st.success(f"Default admin user '{ADMIN_USERNAME}' created. Password: '{ADMIN_PASSWORD}'")
+        return st.success, f"Default admin user '{ADMIN_USERNAME}' created. Password: '{ADMIN_PASSWORD}'"
     except IntegrityError:
-        db.rollback()
-        st.error("Error creating default admin user (username might already exist).")
-    finally:
-        db.close()
+        return st.error, "Error creating default admin user (username might already exist)."
+
+@st.cache_resource
+def init_db_once():
+    # Schema checks and admin seeding run once per server process instead of on every rerun
+    return {'notice': init_db()}
 
 @st.cache_data(ttl=60) # Cache for 60 seconds
 def get_all_users_for_auth():
-    db = SessionLocal()
-    users = db.query(User).all()
-    db.close()
-    credentials = {"usernames": {}}
-    for user in users:
-        credentials["usernames"][user.username] = {
-            "email": user.email,
-            "name": user.name,
-            "password": user.password_hash # This is the hashed password
-        }
-    return credentials
+    # Parallel (names, usernames, hashed_passwords) tuples in the shape stauth.Authenticate expects
+    with session_scope() as db:
+        rows = db.query(User.name, User.username, User.password_hash).all()
+    names = tuple(row.name for row in rows)
+    usernames = tuple(row.username for row in rows)
+    hashed_passwords = tuple(row.password_hash for row in rows)
+    return names, usernames, hashed_passwords
 
 def get_user_details(username):
-    db = SessionLocal()
-    user = db.query(User).filter_by(username=username).first()
-    db.close()
-    return user
+    with session_scope() as db:
+        return db.query(User).filter_by(username=username).first()
 
 def register_new_user(username, name, password, email, role='staff'):
-    db = SessionLocal()
+    hashed_password = hash_password(password)
     try:
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        new_user = User(username=username, name=name, password_hash=hashed_password, email=email, role=role)
-        db.add(new_user)
-        db.commit()
-        return True
+        with session_scope() as db:
+            db.add(User(username=username, name=name, password_hash=hashed_password, email=email, role=role))
     except IntegrityError:
-        db.rollback()
         return False # Username already exists
-    finally:
-        db.close()
-
-def get_current_user_id():
-    user = get_user_details(st.session_state.get('username'))
-    return user.id if user else None
+    get_all_users_for_auth.clear()
+    return True
 
 @st.cache_data(ttl=5) # Cache inventory data for 5 seconds
 def load_inventory_data(user_id):
     if not user_id: return pd.DataFrame()
-    db = SessionLocal()
-    inventory_items = db.query(Inventory).filter_by(user_id=user_id).all()
-    db.close()
-    if not inventory_items:
-        return pd.DataFrame(columns=['id', 'sku', 'description', 'qty_available', 'location', 'last_updated'])
-    data = [{
-        'id': item.id,
-        'sku': item.sku,
-        'description': item.description,
-        'qty_available': item.qty_available,
-        'location': item.location,
-        'last_updated': item.last_updated
-    } for item in inventory_items]
-    df = pd.DataFrame(data)
-    df['last_updated'] = pd.to_datetime(df['last_updated'])
+    query = select(
+        Inventory.id, Inventory.sku, Inventory.description,
+        Inventory.qty_available, Inventory.location, Inventory.last_updated
+    ).where(Inventory.user_id == user_id)
+    df = pd.read_sql_query(query, engine, parse_dates=['last_updated'])
+    # Arrow-backed strings: lower() and the search's contains() run as vectorized Arrow kernels
+    df[['sku', 'description']] = df[['sku', 'description']].astype('string[pyarrow]')
+    # Lowercased SKU + description, built once per load so searching is a single substring scan
+    df['_search'] = df['sku'].str.lower() + '\x00' + df['description'].fillna('').str.lower()
+    # Compact dtypes: categorical locations and downcast ids keep the cached frame small.
+    # qty_available stays float64; float32 would put values like 12.30000019 into the export
+    df['location'] = df['location'].astype('category')
+    df['id'] = pd.to_numeric(df['id'], downcast='integer')
     return df
 
+@st.cache_data(ttl=5)
+def get_overview_kpis(user_id):
+    if not user_id: return 0, 0, 0, 0
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT COUNT(DISTINCT sku), COALESCE(SUM(qty_available), 0), "
+            "COUNT(DISTINCT CASE WHEN qty_available < :threshold THEN sku END), COUNT(DISTINCT location) "
+            "FROM inventory WHERE user_id = :user_id"
+        ), {'user_id': user_id, 'threshold': LOW_STOCK_THRESHOLD}).one()
+    return tuple(row)
+
+@st.cache_data(ttl=5)
+def get_low_stock_items(user_id):
+    if not user_id: return pd.DataFrame()
+    query = text(
+        "SELECT sku, description, qty_available, location FROM inventory "
+        "WHERE user_id = :user_id AND qty_available < :threshold ORDER BY qty_available LIMIT :limit"
+    )
+    return pd.read_sql_query(query, engine, params={'user_id': user_id, 'threshold': LOW_STOCK_THRESHOLD, 'limit': MAX_LOW_STOCK_ROWS}, dtype_backend='pyarrow')
+
+@st.cache_data(ttl=5)
+def get_location_summary(user_id):
+    if not user_id: return pd.DataFrame()
+    query = text(
+        "SELECT location, SUM(qty_available) AS qty_available FROM inventory "
+        "WHERE user_id = :user_id GROUP BY location"
+    )
+    return pd.read_sql_query(query, engine, params={'user_id': user_id})
+
+@st.cache_data(ttl=5)
+def get_top_items(user_id, n=10):
+    if not user_id: return pd.DataFrame()
+    query = text(
+        "SELECT sku, qty_available FROM inventory "
+        "WHERE user_id = :user_id ORDER BY qty_available DESC LIMIT :n"
+    )
+    return pd.read_sql_query(query, engine, params={'user_id': user_id, 'n': n})
+
+@st.cache_data(ttl=5)
+def get_locations(user_id):
+    if not user_id: return []
+    # Read straight off ix_inv_user_loc instead of scanning the loaded frame
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT DISTINCT location FROM inventory WHERE user_id = :user_id ORDER BY location"
+        ), {'user_id': user_id}).scalars().all()
+
+def clear_inventory_caches():
+    # Invalidate only the inventory-derived caches; logs, transactions and auth stay warm
+    for loader in (load_inventory_data, get_overview_kpis, get_low_stock_items, get_location_summary, get_top_items, get_locations,
+                   build_low_stock_chart, build_location_pie, build_top_items_chart, export_inventory_xlsx):
+        loader.clear()
+
 def add_inventory_item(user_id, sku, description, qty_available, location):
-    db = SessionLocal()
     try:
-        new_item = Inventory(user_id=user_id, sku=sku, description=description,
-                             qty_available=qty_available, location=location)
-        db.add(new_item)
-        db.commit()
-        add_log_entry(user_id, 'ADD', sku, f"Added new item: Qty {qty_available}, Loc {location}")
-        record_transaction(user_id, sku, 'IN', qty_available, qty_available)
-        st.cache_data.clear() # Clear cache to refresh data
-        return True
+        with session_scope() as db:
+            new_item = Inventory(user_id=user_id, sku=sku, description=description,
+                                 qty_available=qty_available, location=location)
+            db.add(new_item)
+            db.flush() # Surface a duplicate SKU before logging the change
+            add_log_entry(user_id, 'ADD', sku, f"Added new item: Qty {qty_available}, Loc {location}")
+            record_transaction(user_id, sku, 'IN', qty_available, qty_available)
     except IntegrityError:
-        db.rollback()
         return False # SKU already exists for this user
-    finally:
-        db.close()
+    clear_inventory_caches() # Refresh inventory views only
+    clear_log_caches()
+    clear_transaction_caches()
+    return True
+
+def insert_in_chunks(db, table, columns, rows, suffix=''):
+    # Multi-row INSERT ... VALUES batches, sized to stay under SQLite's historical 999 bound-parameter limit.
+    # Plain SQL text: only the full batch and the final partial one are prepared, and sqlite3 reuses both
+    if not rows: return
+    chunk_size = min(500, 999 // len(columns))
+    row_sql = f"({', '.join('?' * len(columns))})"
+    head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    conn = db.connection()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        conn.exec_driver_sql(head + ', '.join([row_sql] * len(chunk)) + suffix, tuple(v for row in chunk for v in row))
+
+def upsert_inventory(user_id, df):
+    # Insert or update a whole batch (columns: sku, description, qty_available, location) in one transaction
+    df = df.drop_duplicates('sku', keep='first') # The first row wins when a sheet repeats a SKU
+    with session_scope() as db:
+        # Record transactions only for new SKUs and changed quantities, with the real delta as update_inventory_item does
+        old_qty = df['sku'].map(dict(db.execute(text(
+            "SELECT sku, qty_available FROM inventory WHERE user_id = :user_id"
+        ), {'user_id': user_id}).all())).astype('float64')
+        delta = df['qty_available'] - old_qty.fillna(0)
+        moved = df.assign(user_id=user_id, type=np.where(delta < 0, 'OUT', 'IN'), change=delta.abs())[old_qty.isna() | (delta != 0)]
+        trans_rows = list(moved[['user_id', 'sku', 'type', 'change', 'qty_available']].itertuples(index=False, name=None))
+        df = df.astype(object).where(df.notna(), None).assign(user_id=user_id) # Missing cells are stored as NULL
+        rows = list(df[['user_id', 'sku', 'description', 'qty_available', 'location']].itertuples(index=False, name=None))
+        insert_in_chunks(db, 'inventory', ['user_id', 'sku', 'description', 'qty_available', 'location'], rows, suffix=(
+            " ON CONFLICT (user_id, sku) DO UPDATE SET description = excluded.description, "
+            f"qty_available = excluded.qty_available, location = excluded.location, last_updated = {LOCAL_NOW_SQL} "
+            # Existing rows whose values are unchanged are skipped rather than rewritten
+            "WHERE description IS NOT excluded.description OR qty_available IS NOT excluded.qty_available "
+            "OR location IS NOT excluded.location"
+        ))
+        insert_in_chunks(db, 'transactions', ['user_id', 'sku', 'type', 'quantity_change', 'current_qty'], trans_rows)
+    clear_inventory_caches() # Refresh inventory views only
+    clear_transaction_caches()
+    return len(rows)
+
+def replace_inventory(user_id, df):
+    # Make the user's inventory match an uploaded sheet; the upsert, tombstone delete and UPLOAD log share one commit
+    with session_scope() as db:
+        success_count = upsert_inventory(user_id, df)
+        # Stage the sheet's SKUs in a temp table so the delete does not hit SQLite's bound-parameter limit.
+        # Temp tables are per connection, and a pooled connection serves one transaction at a time
+        db.execute(text("CREATE TEMP TABLE IF NOT EXISTS upload_skus (sku TEXT PRIMARY KEY)"))
+        db.execute(text("DELETE FROM upload_skus"))
+        if not df.empty:
+            db.execute(text("INSERT OR IGNORE INTO upload_skus (sku) VALUES (:sku)"), [{'sku': sku} for sku in df['sku']])
+        db.execute(text(
+            "DELETE FROM inventory WHERE user_id = :user_id AND sku NOT IN (SELECT sku FROM upload_skus)"
+        ), {'user_id': user_id})
+        add_log_entry(user_id, 'UPLOAD', details=f"Uploaded {success_count} items from Excel.")
+    # Clear again once committed, so no reader can re-cache the pre-upload rows in between
+    clear_inventory_caches()
+    clear_log_caches()
+    clear_transaction_caches()
+    return success_count
 
 def update_inventory_item(user_id, item_id, sku, description, qty_available, location):
-    db = SessionLocal()
     try:
-        item = db.query(Inventory).filter_by(id=item_id, user_id=user_id).first()
-        if item:
+        with session_scope() as db:
+            item = db.query(Inventory).filter_by(id=item_id, user_id=user_id).first()
+            if not item:
+                return False
             old_qty = item.qty_available
             old_sku = item.sku
             item.sku = sku
             item.description = description
             item.qty_available = qty_available
             item.location = location
-            db.commit()
+            db.flush() # Surface a duplicate SKU before logging the change
 
             log_details = f"Updated item. Old SKU: {old_sku}, New SKU: {sku}, Old Qty: {old_qty}, New Qty: {qty_available}"
             add_log_entry(user_id, 'EDIT', sku, log_details)
@@ -460,127 +651,496 @@ def update_inventory_item(user_id, item_id, sku, description, qty_available, loc
                 trans_type = 'IN' if qty_available > old_qty else 'OUT'
                 change = abs(qty_available - old_qty)
                 record_transaction(user_id, sku, trans_type, change, qty_available)
-
-            st.cache_data.clear() # Clear cache to refresh data
-            return True
-        return False
     except IntegrityError:
-        db.rollback()
         return False # SKU already exists for this user
-    finally:
-        db.close()
+    clear_inventory_caches() # Refresh inventory views only
+    clear_log_caches()
+    clear_transaction_caches()
+    return True
+
+def get_inventory_item(user_id, item_id):
+    # Primary-key lookup for a single row, instead of a boolean-mask scan of the loaded frame
+    with engine.connect() as conn:
+        row = conn.execute(select(
+            Inventory.id, Inventory.sku, Inventory.description, Inventory.qty_available, Inventory.location
+        ).where(Inventory.id == item_id, Inventory.user_id == user_id)).first()
+    return row._asdict() if row else None
 
 def delete_inventory_item(user_id, item_id):
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         item = db.query(Inventory).filter_by(id=item_id, user_id=user_id).first()
-        if item:
-            sku_deleted = item.sku
-            db.delete(item)
-            db.commit()
-            add_log_entry(user_id, 'DELETE', sku_deleted, f"Deleted item: {sku_deleted}")
-            st.cache_data.clear() # Clear cache to refresh data
-            return True
-        return False
-    finally:
-        db.close()
+        if not item:
+            return False
+        sku_deleted = item.sku
+        db.delete(item)
+        add_log_entry(user_id, 'DELETE', sku_deleted, f"Deleted item: {sku_deleted}")
+    clear_inventory_caches() # Refresh inventory views only
+    clear_log_caches()
+    return True
 
 @st.cache_data(ttl=10) # Cache logs for 10 seconds
-def load_logs_data(user_id):
+def load_logs_data(user_id, page=1, page_size=LOGS_PAGE_SIZE):
     if not user_id: return pd.DataFrame()
-    db = SessionLocal()
-    logs = db.query(Log).filter_by(user_id=user_id).order_by(Log.timestamp.desc()).all()
-    db.close()
-    if not logs:
-        return pd.DataFrame(columns=['timestamp', 'user', 'action', 'sku', 'details'])
-    data = [{
-        'timestamp': log.timestamp,
-        'user': log.user.username if log.user else 'N/A',
-        'action': log.action,
-        'sku': log.sku,
-        'details': log.details
-    } for log in logs]
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
+    # One page of the displayed columns; logs are already scoped to one user, so no join for the username
+    query = select(
+        Log.timestamp, Log.action, Log.sku, Log.details
+    ).where(Log.user_id == user_id).order_by(Log.timestamp.desc(), Log.id.desc()).limit(page_size).offset((page - 1) * page_size)
+    # Arrow-backed columns go to st.dataframe without re-encoding the text columns on every rerun
+    return pd.read_sql_query(query, engine, parse_dates=['timestamp'], dtype_backend='pyarrow')
+
+@st.cache_data(ttl=10)
+def count_logs(user_id):
+    if not user_id: return 0
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(Log.id)).where(Log.user_id == user_id)).scalar_one()
+
+def clear_log_caches():
+    load_logs_data.clear()
+    count_logs.clear()
 
 def add_log_entry(user_id, action, sku=None, details=None):
-    db = SessionLocal()
-    try:
-        new_log = Log(user_id=user_id, action=action, sku=sku, details=details)
-        db.add(new_log)
-        db.commit()
-        st.cache_data.clear() # Clear cache for logs
-    finally:
-        db.close()
+    with session_scope() as db:
+        db.add(Log(user_id=user_id, action=action, sku=sku, details=details))
+    clear_log_caches()
 
 def clear_all_logs(user_id):
-    db = SessionLocal()
     try:
-        db.query(Log).filter_by(user_id=user_id).delete()
-        db.commit()
-        st.cache_data.clear() # Clear cache for logs
-        return True
+        with session_scope() as db:
+            db.query(Log).filter_by(user_id=user_id).delete()
     except Exception as e:
-        db.rollback()
         st.error(f"Error clearing logs: {e}")
         return False
-    finally:
-        db.close()
-
-@st.cache_data(ttl=10)
-def load_transactions_data(user_id):
+    clear_log_caches()
+    return True
+
+@st.cache_data(ttl=60)
+def get_sku_trend(user_id, sku):
+    if not user_id or not sku: return pd.DataFrame()
+    # Only the selected SKU's history; served by ix_tx_user_sku_ts
+    query = select(
+        Transaction.timestamp, Transaction.current_qty
+    ).where(Transaction.user_id == user_id, Transaction.sku == sku).order_by(Transaction.timestamp.asc(), Transaction.id.asc())
+    return pd.read_sql_query(query, engine, parse_dates=['timestamp'])
+
+@st.cache_data(ttl=60)
+def get_transaction_skus(user_id):
+    if not user_id: return []
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT DISTINCT sku FROM transactions WHERE user_id = :user_id ORDER BY sku"
+        ), {'user_id': user_id}).scalars().all()
+
+@st.cache_data(ttl=60)
+def get_monthly_in_out(user_id):
     if not user_id: return pd.DataFrame()
-    db = SessionLocal()
-    transactions = db.query(Transaction).filter_by(user_id=user_id).order_by(Transaction.timestamp.asc()).all()
-    db.close()
-    if not transactions:
-        return pd.DataFrame(columns=['timestamp', 'sku', 'type', 'quantity_change', 'current_qty'])
-    data = [{
-        'timestamp': t.timestamp,
-        'sku': t.sku,
-        'type': t.type,
-        'quantity_change': t.quantity_change,
-        'current_qty': t.current_qty
-    } for t in transactions]
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
+    # One row per month with IN and OUT side by side, so there is nothing left to unstack in pandas
+    query = text(
+        "SELECT strftime('%Y-%m', timestamp) AS Month, "
+        "SUM(CASE WHEN type = 'IN' THEN quantity_change ELSE 0 END) AS \"IN\", "
+        "SUM(CASE WHEN type = 'OUT' THEN quantity_change ELSE 0 END) AS \"OUT\" "
+        "FROM transactions WHERE user_id = :user_id GROUP BY Month ORDER BY Month"
+    )
+    return pd.read_sql_query(query, engine, params={'user_id': user_id})
+
+@st.cache_data(ttl=60)
+def forecast_sku_trend(user_id, sku, horizon_days=30):
+    # Least-squares line through the SKU's history (x = days since its first transaction), projected past the last day
+    trend_df = get_sku_trend(user_id, sku)
+    if len(trend_df) < 2: return pd.DataFrame()
+    start = trend_df['timestamp'].min()
+    x = (trend_df['timestamp'] - start).dt.days.to_numpy()
+    y = trend_df['current_qty'].to_numpy(dtype='float64')
+    if np.ptp(x) == 0: # All points on one day: flat line at the mean
+        slope, intercept = 0.0, y.mean()
+    else:
+        slope, intercept = np.polyfit(x, y, 1)
+    future_days = np.arange(x.max() + 1, x.max() + horizon_days + 1)
+    return pd.DataFrame({
+        'timestamp': start + pd.to_timedelta(future_days, unit='D'),
+        'current_qty': slope * future_days + intercept,
+        'type': 'Predicted'
+    })
+
+def clear_transaction_caches():
+    for loader in (get_sku_trend, get_transaction_skus, get_monthly_in_out, forecast_sku_trend,
+                   build_sku_trend_chart, build_monthly_in_out_chart, build_forecast_chart):
+        loader.clear()
 
 def record_transaction(user_id, sku, trans_type, quantity_change, current_qty):
-    db = SessionLocal()
-    try:
-        new_transaction = Transaction(
+    with session_scope() as db:
+        db.add(Transaction(
             user_id=user_id,
             sku=sku,
             type=trans_type,
             quantity_change=quantity_change,
             current_qty=current_qty
+        ))
+    clear_transaction_caches()
+
+# --- Chart Helpers ---
+def downsample_lttb(df, x_col, y_col, n_out=MAX_CHART_POINTS):
+    # Largest-Triangle-Three-Buckets: keeps the visual shape of a series using at most n_out points
+    n = len(df)
+    if n <= n_out or n_out < 3:
+        return df
+    x = df[x_col].to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('int64')
+    x = x.astype('float64')
+    y = df[y_col].to_numpy(dtype='float64')
+
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return df.iloc[selected]
+
+# --- Excel Helpers ---
+# Reruns with the same upload skip re-parsing. The key is a SHA-256 of the file: hashlib's OpenSSL
+# SHA-256 uses the CPU's SHA extensions where available and outpaces Streamlit's default md5 of the bytes
+@st.cache_data(show_spinner=False, max_entries=4, hash_funcs={bytes: lambda data: hashlib.sha256(data).digest()})
+def parse_inventory_xlsx(file_bytes):
+    # calamine parses in Rust and returns cached formula values; only the imported columns are kept
+    return pd.read_excel(
+        io.BytesIO(file_bytes),
+        engine='calamine',
+        usecols=lambda col: col in UPLOAD_COLUMNS,
+        dtype={'SKU': 'string', 'Description': 'string', 'Location': 'string'}
+    )
+
+def inventory_to_xlsx(df, sheet_name='Inventory'):
+    # Stream rows through xlsxwriter's constant_memory mode so only one row is held at a time.
+    # df.to_excel writes column by column, which that mode silently truncates, so write rows directly.
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, list(df.columns))
+    values = df.astype(object).where(df.notna(), None) # Blank cells for NaN/NaT/NA
+    for row_idx, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_idx, 0, row)
+    workbook.close()
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner=False) # Rebuilt only after an inventory change clears it
+def export_inventory_xlsx(user_id):
+    return inventory_to_xlsx(load_inventory_data(user_id).drop(columns='_search'))
+
+# Overview figures are cached per user alongside the queries they are built from
+@st.cache_data(ttl=5)
+def build_low_stock_chart(user_id):
+    return px.bar(get_low_stock_items(user_id), x='sku', y='qty_available',
+                  color='qty_available', color_continuous_scale='Reds',
+                  title='Top Low Stock Items',
+                  labels={'qty_available': 'Quantity Available', 'sku': 'SKU'})
+
+@st.cache_data(ttl=5)
+def build_location_pie(user_id):
+    return px.pie(get_location_summary(user_id), values='qty_available', names='location',
+                  title='Total Quantity by Location',
+                  hole=0.3)
+
+@st.cache_data(ttl=5)
+def build_top_items_chart(user_id, n=10):
+    return px.bar(get_top_items(user_id, n=n), x='sku', y='qty_available',
+                  color='qty_available', color_continuous_scale='Viridis',
+                  title=f'Top {n} Items by Quantity')
+
+@st.cache_data(ttl=60)
+def build_sku_trend_chart(user_id, sku):
+    return px.line(downsample_lttb(get_sku_trend(user_id, sku), 'timestamp', 'current_qty'), x='timestamp', y='current_qty',
+                   title=f'Stock Level Trend for SKU: {sku}',
+                   labels={'current_qty': 'Quantity', 'timestamp': 'Date'},
+                   render_mode='webgl')
+
+@st.cache_data(ttl=60)
+def build_monthly_in_out_chart(user_id):
+    return px.bar(get_monthly_in_out(user_id), x='Month', y=['IN', 'OUT'],
+                  title='Monthly Stock Inflow vs. Outflow',
+                  labels={'value': 'Quantity', 'variable': 'Type'},
+                  barmode='group')
+
+@st.cache_data(ttl=60)
+def build_forecast_chart(user_id, sku):
+    actual_df = downsample_lttb(get_sku_trend(user_id, sku), 'timestamp', 'current_qty').assign(type='Actual')
+    combined_df = pd.concat([actual_df, forecast_sku_trend(user_id, sku)])
+    return px.line(combined_df, x='timestamp', y='current_qty', color='type',
+                   title=f'Stock Level Forecast for SKU: {sku}',
+                   labels={'current_qty': 'Quantity', 'timestamp': 'Date'},
+                   color_discrete_map={'Actual': 'blue', 'Predicted': 'red'},
+                   render_mode='webgl')
+
+# --- UI Fragments ---
+# Plain functions rather than fragments of their own: a form only reruns on submit, and a successful
+# submit has to refresh the surrounding inventory_browser fragment, not just the form
+def add_item_form(current_user_id, all_locations):
+    with st.form("add_item_form", clear_on_submit=True):
+        st.subheader("Add New Inventory Item")
+        new_sku = st.text_input("SKU", key="new_sku")
+        new_description = st.text_area("Description", key="new_desc")
+        new_qty = st.number_input("Quantity Available", min_value=0.0, step=1.0, key="new_qty")
+        new_location = st.selectbox("Location", options=all_locations + ["Add New Location"], key="new_loc_select")
+
+        if new_location == "Add New Location":
+            new_location_text = st.text_input("Enter New Location", key="new_loc_text")
+            if new_location_text:
+                new_location = new_location_text
+            else:
+                st.warning("Please enter a new location name.")
+                new_location = None # Prevent adding if new location not typed
+
+        submitted = st.form_submit_button("Add Item")
+        if submitted and new_location:
+            if not new_sku:
+                st.error("SKU cannot be empty!")
+            elif add_inventory_item(current_user_id, new_sku, new_description, new_qty, new_location):
+                st.success(f"Item '{new_sku}' added successfully!")
+                st.session_state['show_add_form'] = False
+                st.rerun() # The whole app, so Overview KPIs and charts show the new item
+            else:
+                st.error(f"Failed to add item. SKU '{new_sku}' might already exist.")
+
+def edit_item_form(current_user_id, item_to_edit, all_locations):
+    with st.form("edit_item_form"):
+        st.subheader(f"Edit Item: {item_to_edit['sku']}")
+        edit_sku = st.text_input("SKU", value=item_to_edit['sku'], key="edit_sku")
+        edit_description = st.text_area("Description", value=item_to_edit['description'] if pd.notna(item_to_edit['description']) else "", key="edit_desc")
+        edit_qty = st.number_input("Quantity Available", min_value=0.0, step=1.0, value=float(item_to_edit['qty_available'] or 0), key="edit_qty")
+        edit_location = st.selectbox("Location", options=all_locations + ["Add New Location"], index=all_locations.index(item_to_edit['location']) if item_to_edit['location'] in all_locations else 0, key="edit_loc_select")
+
+        if edit_location == "Add New Location":
+            edit_location_text = st.text_input("Enter New Location", key="edit_loc_text")
+            if edit_location_text:
+                edit_location = edit_location_text
+            else:
+                st.warning("Please enter a new location name.")
+                edit_location = None
+
+        submitted = st.form_submit_button("Update Item")
+        if submitted and edit_location:
+            if not edit_sku:
+                st.error("SKU cannot be empty!")
+            elif update_inventory_item(current_user_id, int(item_to_edit['id']), edit_sku, edit_description, edit_qty, edit_location):
+                st.success(f"Item '{edit_sku}' updated successfully!")
+                st.session_state['show_edit_form'] = False
+                st.session_state['st_dataframe_selection'] = {'rows': []} # Clear selection
+                st.rerun() # The whole app, so Overview KPIs and charts show the change
+            else:
+                st.error(f"Failed to update item. SKU '{edit_sku}' might already exist or item not found.")
+
+@st.fragment # Search, paging and form toggles rerun on their own; saved item changes rerun the whole app
+def inventory_browser(current_user_id):
+    # Loaded inside the fragment so a fragment-scoped rerun picks up its own edits
+    inventory_df = load_inventory_data(current_user_id)
+
+    # Search and Filter
+    col_filter1, col_filter2 = st.columns([3, 1])
+    with col_filter1:
+        search_term = st.text_input("Search by SKU or Description", "").lower()
+    with col_filter2:
+        all_locations = get_locations(current_user_id) or DEFAULT_LOCATIONS
+        selected_locations = st.multiselect("Filter by Location", options=all_locations, default=all_locations)
+
+    # Combine the filters into one mask and slice once, rather than materializing a frame per filter
+    mask = np.ones(len(inventory_df), dtype=bool)
+    if search_term:
+        mask &= inventory_df['_search'].str.contains(search_term, regex=False, na=False).to_numpy(dtype=bool)
+    if selected_locations:
+        mask &= inventory_df['location'].isin(selected_locations).to_numpy()
+    filtered_df = inventory_df if mask.all() else inventory_df[mask]
+
+    # Display Inventory Table
+    st.subheader("Current Inventory")
+    if not filtered_df.empty:
+        # Page the table so only the visible rows are copied and serialized for the browser
+        total_pages = max(1, math.ceil(len(filtered_df) / INVENTORY_PAGE_SIZE))
+        page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, value=1, step=1)
+        page_df = filtered_df.iloc[(page - 1) * INVENTORY_PAGE_SIZE:page * INVENTORY_PAGE_SIZE]
+        # Add a 'Status' column for conditional formatting (visual only); only the shown columns are copied
+        display_df = page_df[INVENTORY_DISPLAY_COLUMNS].assign(
+            Status=np.where(page_df['qty_available'] < LOW_STOCK_THRESHOLD, "🚨 Low", "✅ OK")
         )
-        db.add(new_transaction)
-        db.commit()
-        st.cache_data.clear() # Clear cache for transactions
-    finally:
-        db.close()
+        # Custom styling for dataframe rows (limited in st.dataframe)
+        # A more advanced table like st_aggrid would be needed for true row styling.
+        # For now, we'll just display the status.
+        st.dataframe(
+            display_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'qty_available': st.column_config.NumberColumn("Quantity Available"),
+                'last_updated': st.column_config.DatetimeColumn("Last Updated", format="YYYY-MM-DD HH:mm"),
+            },
+            height=400,
+            selection_mode='single-row'
+        )
+        selected_rows = st.session_state.get('st_dataframe_selection', {'rows': []})
+        selected_item_id = selected_rows['rows'][0] if selected_rows['rows'] else None
+    else:
+        st.info("No inventory items found matching your criteria.")
+        selected_item_id = None
+
+    st.markdown("---")
+
+    # Add/Edit/Delete Forms
+    col_crud1, col_crud2, col_crud3 = st.columns(3)
+    with col_crud1:
+        if st.button("➕ Add New Item", key="add_item_btn"):
+            st.session_state['show_add_form'] = True
+            st.session_state['show_edit_form'] = False
+    with col_crud2:
+        if st.button("✏️ Edit Selected Item", key="edit_item_btn", disabled=selected_item_id is None):
+            st.session_state['show_edit_form'] = True
+            st.session_state['show_add_form'] = False
+    with col_crud3:
+        if st.button("🗑️ Delete Selected Item", key="delete_item_btn", disabled=selected_item_id is None):
+            if st.session_state.get('confirm_delete', False):
+                with st.spinner("Deleting item..."):
+                    if delete_inventory_item(current_user_id, selected_item_id):
+                        st.success("Item deleted successfully!")
+                        st.session_state['confirm_delete'] = False
+                        st.session_state['st_dataframe_selection'] = {'rows': []} # Clear selection
+                        st.rerun() # The whole app, so Overview KPIs and charts drop the item
+                    else:
+                        st.error("Failed to delete item.")
+            else:
+                st.warning("Are you sure you want to delete this item? Click again to confirm.")
+                st.session_state['confirm_delete'] = True
+        else:
+            st.session_state['confirm_delete'] = False
+
+
+    # Add Item Form
+    if st.session_state.get('show_add_form'):
+        add_item_form(current_user_id, all_locations)
+
+    # Edit Item Form
+    if st.session_state.get('show_edit_form') and selected_item_id is not None:
+        item_to_edit = get_inventory_item(current_user_id, selected_item_id)
+        if item_to_edit:
+            edit_item_form(current_user_id, item_to_edit, all_locations)
+
+@st.fragment # Picking a file and processing it rerun only this section
+def upload_inventory_section(current_user_id):
+    st.subheader("Upload Inventory (Excel)")
+    uploaded_file = st.file_uploader("Upload .xlsx file", type=['xlsx'], key="excel_uploader")
+    if uploaded_file:
+        if st.button("Process Uploaded File"):
+            with st.spinner("Processing file..."):
+                try:
+                    required_cols = UPLOAD_COLUMNS
+                    df_uploaded = parse_inventory_xlsx(uploaded_file.getvalue())
+                    if not all(col in df_uploaded.columns for col in required_cols):
+                        st.error(f"Missing required columns in Excel. Ensure you have: {', '.join(required_cols)}")
+                    else:
+                        records_df = df_uploaded[required_cols].rename(columns={
+                            'SKU': 'sku', 'Description': 'description',
+                            'QTYAVAILABLE': 'qty_available', 'Location': 'location'
+                        }).astype({'sku': 'string', 'description': 'string', 'location': 'string'})
+                        records_df['qty_available'] = pd.to_numeric(records_df['qty_available'], errors='coerce').astype('float64')
+                        records_df = records_df.dropna(subset=['sku']) # Rows without a SKU cannot be stored
+                        # Blank or non-numeric quantities would abort the whole upload; report them by sheet row (header is row 1)
+                        bad_rows = (records_df.index[records_df['qty_available'].isna()] + 2).tolist()
+                        if bad_rows:
+                            shown = ', '.join(map(str, bad_rows[:20])) + (', ...' if len(bad_rows) > 20 else '')
+                            st.error(f"QTYAVAILABLE must be a number. Fix the blank or non-numeric cells in rows: {shown}")
+                        else:
+                            success_count = replace_inventory(current_user_id, records_df)
+                            st.success(f"Successfully uploaded {success_count} items. Items missing from the file were removed.")
+                            st.rerun() # The whole app, since every tab reads the replaced inventory
+                except Exception as e:
+                    st.error(f"Error processing file: {e}")
+
+@st.fragment # Paging and clearing the log rerun only this tab
+def activity_log_panel(current_user_id):
+    # Page the log in SQL so only the visible entries are loaded and sent to the browser
+    log_total_pages = max(1, math.ceil(count_logs(current_user_id) / LOGS_PAGE_SIZE))
+    log_page = st.number_input(f"Log page (of {log_total_pages})", min_value=1, max_value=log_total_pages, value=1, step=1)
+    logs_df = load_logs_data(current_user_id, log_page)
+    if not logs_df.empty:
+        st.dataframe(logs_df, use_container_width=True, height=500, hide_index=True)
+    else:
+        st.info("No activity logs yet.")
+
+    st.markdown("---")
+    if st.session_state['user_role'] == 'admin':
+        if st.button("🗑️ Clear All Logs (Admin Only)", key="clear_logs_btn"):
+            if st.warning("Are you sure you want to clear all logs for this user? This action cannot be undone."):
+                if clear_all_logs(current_user_id):
+                    st.success("All logs cleared successfully.")
+                    st.rerun(scope="fragment")
+                else:
+                    st.error("Failed to clear logs.")
+    else:
+        st.info("Only admin users can clear logs.")
+
+@st.fragment # Picking a SKU reruns only the analytics, not the other tabs
+def analytics_panel(current_user_id):
+    transaction_skus = get_transaction_skus(current_user_id)
+    st.info("This section provides basic analytics. For true advanced forecasting, a dedicated ML model (e.g., ARIMA, Prophet) would be integrated with more historical data points.")
+
+    if transaction_skus:
+        st.subheader("Historical Stock Movement")
+
+        # Plot stock trend for a selected SKU
+        # This is a simplification; a more robust approach would reconstruct stock from initial inventory + all transactions.
+        # For this example, we'll use the 'current_qty' from transactions as a proxy for stock level at that time.
+        selected_sku_for_trend = st.selectbox("Select SKU for Trend Analysis", options=transaction_skus)
+        sku_trend_df = get_sku_trend(current_user_id, selected_sku_for_trend)
+        if selected_sku_for_trend:
+            if not sku_trend_df.empty:
+                st.plotly_chart(build_sku_trend_chart(current_user_id, selected_sku_for_trend), use_container_width=True)
+            else:
+                st.info(f"No transaction data for SKU: {selected_sku_for_trend}")
+
+        st.markdown("---")
+
+        st.subheader("Inflow and Outflow Analysis")
+        # Monthly totals per transaction type, aggregated in SQL
+        st.plotly_chart(build_monthly_in_out_chart(current_user_id), use_container_width=True)
+
+        st.markdown("---")
+
+        st.subheader("Forecasting (Basic Trend)")
+        st.info("This is a simple linear trend projection. For more accurate forecasting, consider integrating time series models like ARIMA or Prophet, which require more data and complexity.")
+
+        if selected_sku_for_trend and not sku_trend_df.empty:
+            # Simple linear regression for future projection (very basic)
+            # Project 30 days into the future
+            future_df = forecast_sku_trend(current_user_id, selected_sku_for_trend)
+
+            if not future_df.empty: # Need at least 2 points for linear regression
+                st.plotly_chart(build_forecast_chart(current_user_id, selected_sku_for_trend), use_container_width=True)
+            else:
+                st.info("Not enough data points for forecasting. Need at least two transactions for this SKU.")
+        else:
+            st.info("Select an SKU with transaction data to view basic forecasting.")
+
+    else:
+        st.info("No transaction data available for analytics. Add/edit items in Inventory Management to generate transactions.")
 
 # --- Initialize DB on app start ---
-init_db()
+init_notice = init_db_once().pop('notice', None) # Shown to the first session only
+if init_notice:
+    show_notice, notice_text = init_notice
+    show_notice(notice_text)
 
 # --- Authentication ---
-names = []
-usernames = []
-hashed_passwords = []
-
-db_users = get_all_users_for_auth()["usernames"]
-for username, details in db_users.items():
-    usernames.append(username)
-    names.append(details["name"])
-    hashed_passwords.append(details["password"])
+names, usernames, hashed_passwords = get_all_users_for_auth()
 
+# Built on every run: its cookie manager reads the browser's cookies when constructed, so a reused
+# instance would miss cookie logins. Only the credential tuples above are cached
 authenticator = stauth.Authenticate(
-    names,
-    usernames,
-    hashed_passwords,
+    list(names),
+    list(usernames),
+    list(hashed_passwords),
     'inventory_dashboard_cookie',
     'abcdef', # A random string for cookie signature
     cookie_expiry_days=30
@@ -616,12 +1176,19 @@ elif st.session_state["authentication_status"] == None:
                         st.error("Username already exists or registration failed.")
 
 # --- Main Application Logic (if authenticated) ---
+if not st.session_state["authentication_status"]:
+    st.session_state.pop('_cached_for', None) # Logged out: re-fetch user details on next login
+
 if st.session_state["authentication_status"]:
-    # Get current user details
-    current_user = get_user_details(st.session_state["username"])
-    st.session_state['user_id'] = current_user.id
-    st.session_state['user_role'] = current_user.role
-    st.session_state['name'] = current_user.name
+    # Get current user details once per login rather than on every rerun
+    if 'user_id' not in st.session_state or st.session_state.get('_cached_for') != st.session_state["username"]:
+        current_user = get_user_details(st.session_state["username"])
+        st.session_state.update(
+            user_id=current_user.id,
+            user_role=current_user.role,
+            name=current_user.name,
+            _cached_for=st.session_state["username"]
+        )
 
     with st.sidebar:
         st.write(f'Welcome, *{st.session_state["name"]}*!')
@@ -632,11 +1199,8 @@ if st.session_state["authentication_status"]:
 
     tab1, tab2, tab3, tab4 = st.tabs(["Overview", "Inventory Management", "Logs", "Analytics"])
 
-    # --- Load Data for current user ---
+    # Each tab loads only the data it renders; Overview reads SQL aggregates instead of a frame
     current_user_id = st.session_state['user_id']
-    inventory_df = load_inventory_data(current_user_id)
-    logs_df = load_logs_data(current_user_id)
-    transactions_df = load_transactions_data(current_user_id)
 
     with tab1: # --- Overview Tab ---
         st.header("Dashboard Overview")
@@ -644,231 +1208,64 @@ if st.session_state["authentication_status"]:
         # KPIs
         col1, col2, col3, col4 = st.columns(4)
 
-        total_skus = inventory_df['sku'].nunique() if not inventory_df.empty else 0
-        total_quantity = inventory_df['qty_available'].sum() if not inventory_df.empty else 0
-        low_stock_items_count = inventory_df[inventory_df['qty_available'] < LOW_STOCK_THRESHOLD]['sku'].nunique() if not inventory_df.empty else 0
-        unique_locations = inventory_df['location'].nunique() if not inventory_df.empty else 0
+        total_skus, total_quantity, low_stock_items_count, unique_locations = get_overview_kpis(current_user_id)
 
         with col1:
-            st.markdown(f'<div class="kpi-card"><h3>Total SKUs</h3><p style="font-size: 2.2em; font-weight: 700; color: #2980b9;">{total_skus}</p></div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="kpi-card"><h3>Total SKUs</h3><p class="kpi-value">{total_skus}</p></div>', unsafe_allow_html=True)
         with col2:
-            st.markdown(f'<div class="kpi-card"><h3>Total Quantity</h3><p style="font-size: 2.2em; font-weight: 700; color: #2980b9;">{total_quantity:,.0f}</p></div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="kpi-card"><h3>Total Quantity</h3><p class="kpi-value">{total_quantity:,.0f}</p></div>', unsafe_allow_html=True)
         with col3:
-            st.markdown(f'<div class="kpi-card"><h3>Low Stock Items</h3><p style="font-size: 2.2em; font-weight: 700; color: #e74c3c;">{low_stock_items_count}</p></div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="kpi-card"><h3>Low Stock Items</h3><p class="kpi-value alert">{low_stock_items_count}</p></div>', unsafe_allow_html=True)
         with col4:
-            st.markdown(f'<div class="kpi-card"><h3>Unique Locations</h3><p style="font-size: 2.2em; font-weight: 700; color: #2980b9;">{unique_locations}</p></div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="kpi-card"><h3>Unique Locations</h3><p class="kpi-value">{unique_locations}</p></div>', unsafe_allow_html=True)
 
         st.markdown("---")
 
         # Low Stock Alerts
         if low_stock_items_count > 0:
             st.warning(f"⚠️ **{low_stock_items_count}** items are critically low in stock!")
-            low_stock_df = inventory_df[inventory_df['qty_available'] < LOW_STOCK_THRESHOLD].sort_values('qty_available')
+            low_stock_df = get_low_stock_items(current_user_id)
             with st.expander("🚨 View Low Stock Items"):
+                if low_stock_items_count > len(low_stock_df):
+                    st.caption(f"Showing the {len(low_stock_df)} lowest-stock items.")
                 st.dataframe(low_stock_df[['sku', 'description', 'qty_available', 'location']], use_container_width=True)
 
             # Chart for Low Stock Items
-            fig_low_stock = px.bar(low_stock_df, x='sku', y='qty_available',
-                                    color='qty_available', color_continuous_scale='Reds',
-                                    title='Top Low Stock Items',
-                                    labels={'qty_available': 'Quantity Available', 'sku': 'SKU'})
-            st.plotly_chart(fig_low_stock, use_container_width=True)
+            st.plotly_chart(build_low_stock_chart(current_user_id), use_container_width=True)
 
         st.markdown("---")
 
         # Inventory Distribution Charts
-        if not inventory_df.empty:
+        if total_skus > 0:
             col_chart1, col_chart2 = st.columns(2)
 
             with col_chart1:
                 st.subheader("Quantity Distribution by Location")
-                location_summary = inventory_df.groupby('location')['qty_available'].sum().reset_index()
-                fig_location = px.pie(location_summary, values='qty_available', names='location',
-                                      title='Total Quantity by Location',
-                                      hole=0.3)
-                st.plotly_chart(fig_location, use_container_width=True)
+                st.plotly_chart(build_location_pie(current_user_id), use_container_width=True)
 
             with col_chart2:
                 st.subheader("Top 10 Most Stocked Items")
-                top_items = inventory_df.sort_values('qty_available', ascending=False).head(10)
-                fig_top_items = px.bar(top_items, x='sku', y='qty_available',
-                                       color='qty_available', color_continuous_scale='Viridis',
-                                       title='Top 10 Items by Quantity')
-                st.plotly_chart(fig_top_items, use_container_width=True)
+                st.plotly_chart(build_top_items_chart(current_user_id, n=10), use_container_width=True)
         else:
             st.info("No inventory data to display charts. Add some items!")
 
     with tab2: # --- Inventory Management Tab ---
         st.header("Inventory Management")
-
-        # Search and Filter
-        col_filter1, col_filter2 = st.columns([3, 1])
-        with col_filter1:
-            search_term = st.text_input("Search by SKU or Description", "").lower()
-        with col_filter2:
-            all_locations = inventory_df['location'].unique().tolist() if not inventory_df.empty else DEFAULT_LOCATIONS
-            selected_locations = st.multiselect("Filter by Location", options=all_locations, default=all_locations)
-
-        filtered_df = inventory_df
-        if search_term:
-            filtered_df = filtered_df[
-                filtered_df['sku'].str.lower().str.contains(search_term) |
-                filtered_df['description'].str.lower().str.contains(search_term)
-            ]
-        if selected_locations:
-            filtered_df = filtered_df[filtered_df['location'].isin(selected_locations)]
-
-        # Display Inventory Table
-        st.subheader("Current Inventory")
-        if not filtered_df.empty:
-            # Add a 'Status' column for conditional formatting (visual only)
-            display_df = filtered_df.copy()
-            display_df['Status'] = display_df['qty_available'].apply(
-                lambda x: "🚨 Low" if x < LOW_STOCK_THRESHOLD else "✅ OK"
-            )
-            # Custom styling for dataframe rows (limited in st.dataframe)
-            # A more advanced table like st_aggrid would be needed for true row styling.
-            # For now, we'll just display the status.
-            st.dataframe(
-                display_df[['sku', 'description', 'qty_available', 'location', 'last_updated', 'Status']],
-                use_container_width=True,
-                hide_index=True,
-                height=400,
-                selection_mode='single-row'
-            )
-            selected_rows = st.session_state.get('st_dataframe_selection', {'rows': []})
-            selected_item_id = selected_rows['rows'][0] if selected_rows['rows'] else None
-        else:
-            st.info("No inventory items found matching your criteria.")
-            selected_item_id = None
-
-        st.markdown("---")
-
-        # Add/Edit/Delete Forms
-        col_crud1, col_crud2, col_crud3 = st.columns(3)
-        with col_crud1:
-            if st.button("➕ Add New Item", key="add_item_btn"):
-                st.session_state['show_add_form'] = True
-                st.session_state['show_edit_form'] = False
-        with col_crud2:
-            if st.button("✏️ Edit Selected Item", key="edit_item_btn", disabled=selected_item_id is None):
-                st.session_state['show_edit_form'] = True
-                st.session_state['show_add_form'] = False
-        with col_crud3:
-            if st.button("🗑️ Delete Selected Item", key="delete_item_btn", disabled=selected_item_id is None):
-                if st.session_state.get('confirm_delete', False):
-                    with st.spinner("Deleting item..."):
-                        if delete_inventory_item(current_user_id, selected_item_id):
-                            st.success("Item deleted successfully!")
-                            st.session_state['confirm_delete'] = False
-                            st.session_state['st_dataframe_selection'] = {'rows': []} # Clear selection
-                            st.experimental_rerun()
-                        else:
-                            st.error("Failed to delete item.")
-                else:
-                    st.warning("Are you sure you want to delete this item? Click again to confirm.")
-                    st.session_state['confirm_delete'] = True
-            else:
-                st.session_state['confirm_delete'] = False
-
-
-        # Add Item Form
-        if st.session_state.get('show_add_form'):
-            with st.form("add_item_form", clear_on_submit=True):
-                st.subheader("Add New Inventory Item")
-                new_sku = st.text_input("SKU", key="new_sku")
-                new_description = st.text_area("Description", key="new_desc")
-                new_qty = st.number_input("Quantity Available", min_value=0.0, step=1.0, key="new_qty")
-                new_location = st.selectbox("Location", options=all_locations + ["Add New Location"], key="new_loc_select")
-
-                if new_location == "Add New Location":
-                    new_location_text = st.text_input("Enter New Location", key="new_loc_text")
-                    if new_location_text:
-                        new_location = new_location_text
-                    else:
-                        st.warning("Please enter a new location name.")
-                        new_location = None # Prevent adding if new location not typed
-
-                submitted = st.form_submit_button("Add Item")
-                if submitted and new_location:
-                    if not new_sku:
-                        st.error("SKU cannot be empty!")
-                    elif add_inventory_item(current_user_id, new_sku, new_description, new_qty, new_location):
-                        st.success(f"Item '{new_sku}' added successfully!")
-                        st.session_state['show_add_form'] = False
-                        st.experimental_rerun()
-                    else:
-                        st.error(f"Failed to add item. SKU '{new_sku}' might already exist.")
-
-        # Edit Item Form
-        if st.session_state.get('show_edit_form') and selected_item_id is not None:
-            item_to_edit = inventory_df[inventory_df['id'] == selected_item_id].iloc[0]
-            with st.form("edit_item_form"):
-                st.subheader(f"Edit Item: {item_to_edit['sku']}")
-                edit_sku = st.text_input("SKU", value=item_to_edit['sku'], key="edit_sku")
-                edit_description = st.text_area("Description", value=item_to_edit['description'], key="edit_desc")
-                edit_qty = st.number_input("Quantity Available", min_value=0.0, step=1.0, value=float(item_to_edit['qty_available']), key="edit_qty")
-                edit_location = st.selectbox("Location", options=all_locations + ["Add New Location"], index=all_locations.index(item_to_edit['location']) if item_to_edit['location'] in all_locations else 0, key="edit_loc_select")
-
-                if edit_location == "Add New Location":
-                    edit_location_text = st.text_input("Enter New Location", key="edit_loc_text")
-                    if edit_location_text:
-                        edit_location = edit_location_text
-                    else:
-                        st.warning("Please enter a new location name.")
-                        edit_location = None
-
-                submitted = st.form_submit_button("Update Item")
-                if submitted and edit_location:
-                    if not edit_sku:
-                        st.error("SKU cannot be empty!")
-                    elif update_inventory_item(current_user_id, selected_item_id, edit_sku, edit_description, edit_qty, edit_location):
-                        st.success(f"Item '{edit_sku}' updated successfully!")
-                        st.session_state['show_edit_form'] = False
-                        st.session_state['st_dataframe_selection'] = {'rows': []} # Clear selection
-                        st.experimental_rerun()
-                    else:
-                        st.error(f"Failed to update item. SKU '{edit_sku}' might already exist or item not found.")
+        inventory_browser(current_user_id)
 
         st.markdown("---")
 
         # Excel Upload/Export
         col_excel1, col_excel2 = st.columns(2)
         with col_excel1:
-            st.subheader("Upload Inventory (Excel)")
-            uploaded_file = st.file_uploader("Upload .xlsx file", type=['xlsx'], key="excel_uploader")
-            if uploaded_file:
-                if st.button("Process Uploaded File"):
-                    with st.spinner("Processing file..."):
-                        try:
-                            df_uploaded = pd.read_excel(uploaded_file)
-                            required_cols = ['SKU', 'Description', 'QTYAVAILABLE', 'Location']
-                            if not all(col in df_uploaded.columns for col in required_cols):
-                                st.error(f"Missing required columns in Excel. Ensure you have: {', '.join(required_cols)}")
-                            else:
-                                # Clear existing inventory for the user before adding new
-                                db = SessionLocal()
-                                db.query(Inventory).filter_by(user_id=current_user_id).delete()
-                                db.commit()
-                                success_count = 0
-                                for index, row in df_uploaded.iterrows():
-                                    if add_inventory_item(current_user_id, str(row['SKU']), str(row['Description']), float(row['QTYAVAILABLE']), str(row['Location'])):
-                                        success_count += 1
-                                st.success(f"Successfully uploaded {success_count} items. Existing inventory was cleared.")
-                                add_log_entry(current_user_id, 'UPLOAD', details=f"Uploaded {success_count} items from Excel.")
-                                st.cache_data.clear() # Clear all caches
-                                st.experimental_rerun()
-                        except Exception as e:
-                            st.error(f"Error processing file: {e}")
+            upload_inventory_section(current_user_id)
         with col_excel2:
             st.subheader("Export Inventory (Excel)")
-            if not inventory_df.empty:
-                excel_buffer = io.BytesIO()
-                inventory_df.to_excel(excel_buffer, index=False, sheet_name='Inventory')
-                excel_buffer.seek(0)
+            total_skus = get_overview_kpis(current_user_id)[0]
+            if total_skus:
                 st.download_button(
                     label="Download Inventory as Excel",
-                    data=excel_buffer,
+                    data=lambda: export_inventory_xlsx(current_user_id), # Built only when the button is clicked
                     file_name="inventory_export.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
@@ -879,109 +1276,8 @@ if st.session_state["authentication_status"]:
         st.header("Activity Logs")
         st.subheader(f"Recent Activities for {st.session_state['name']}")
 
-        if not logs_df.empty:
-            st.dataframe(logs_df[['timestamp', 'action', 'sku', 'details']], use_container_width=True, height=500, hide_index=True)
-        else:
-            st.info("No activity logs yet.")
-
-        st.markdown("---")
-        if st.session_state['user_role'] == 'admin':
-            if st.button("🗑️ Clear All Logs (Admin Only)", key="clear_logs_btn"):
-                if st.warning("Are you sure you want to clear all logs for this user? This action cannot be undone."):
-                    if clear_all_logs(current_user_id):
-                        st.success("All logs cleared successfully.")
-                        st.experimental_rerun()
-                    else:
-                        st.error("Failed to clear logs.")
-        else:
-            st.info("Only admin users can clear logs.")
+        activity_log_panel(current_user_id)
 
     with tab4: # --- Analytics & Forecasting Tab ---
         st.header("Advanced Analytics & Forecasting")
-        st.info("This section provides basic analytics. For true advanced forecasting, a dedicated ML model (e.g., ARIMA, Prophet) would be integrated with more historical data points.")
-
-        if not transactions_df.empty:
-            st.subheader("Historical Stock Movement")
-
-            # Aggregate transactions for daily net change
-            transactions_df['date'] = transactions_df['timestamp'].dt.date
-            daily_changes = transactions_df.groupby(['date', 'sku', 'type'])['quantity_change'].sum().unstack(fill_value=0)
-            daily_net_change = daily_changes.apply(lambda x: x.get('IN', 0) - x.get('OUT', 0), axis=1).reset_index(name='net_change')
-
-            # Calculate cumulative stock over time
-            # This is a simplification; a more robust approach would reconstruct stock from initial inventory + all transactions.
-            # For this example, we'll use the 'current_qty' from transactions as a proxy for stock level at that time.
-            stock_over_time = transactions_df.sort_values('timestamp').groupby(['timestamp', 'sku'])['current_qty'].last().reset_index()
-
-            # Plot stock trend for a selected SKU
-            selected_sku_for_trend = st.selectbox("Select SKU for Trend Analysis", options=transactions_df['sku'].unique().tolist())
-            if selected_sku_for_trend:
-                sku_trend_df = stock_over_time[stock_over_time['sku'] == selected_sku_for_trend]
-                if not sku_trend_df.empty:
-                    fig_trend = px.line(sku_trend_df, x='timestamp', y='current_qty',
-                                        title=f'Stock Level Trend for SKU: {selected_sku_for_trend}',
-                                        labels={'current_qty': 'Quantity', 'timestamp': 'Date'})
-                    st.plotly_chart(fig_trend, use_container_width=True)
-                else:
-                    st.info(f"No transaction data for SKU: {selected_sku_for_trend}")
-
-            st.markdown("---")
-
-            st.subheader("Inflow and Outflow Analysis")
-            # Group by date and transaction type
-            daily_in_out = transactions_df.groupby([transactions_df['timestamp'].dt.to_period('M'), 'type'])['quantity_change'].sum().unstack(fill_value=0)
-            daily_in_out.index = daily_in_out.index.astype(str) # Convert PeriodIndex to string for Plotly
-            daily_in_out = daily_in_out.reset_index().rename(columns={'timestamp': 'Month'})
-
-            if 'IN' not in daily_in_out.columns: daily_in_out['IN'] = 0
-            if 'OUT' not in daily_in_out.columns: daily_in_out['OUT'] = 0
-
-            fig_in_out = px.bar(daily_in_out, x='Month', y=['IN', 'OUT'],
-                                 title='Monthly Stock Inflow vs. Outflow',
-                                 labels={'value': 'Quantity', 'variable': 'Type'},
-                                 barmode='group')
-            st.plotly_chart(fig_in_out, use_container_width=True)
-
-            st.markdown("---")
-
-            st.subheader("Forecasting (Basic Trend)")
-            st.info("This is a simple linear trend projection. For more accurate forecasting, consider integrating time series models like ARIMA or Prophet, which require more data and complexity.")
-
-            if selected_sku_for_trend and not sku_trend_df.empty:
-                # Simple linear regression for future projection (very basic)
-                from sklearn.linear_model import LinearRegression
-                import numpy as np
-
-                # Prepare data for regression: convert datetime to numerical (e.g., days since epoch)
-                sku_trend_df['days_since_epoch'] = (sku_trend_df['timestamp'] - sku_trend_df['timestamp'].min()).dt.days
-                X = sku_trend_df['days_since_epoch'].values.reshape(-1, 1)
-                y = sku_trend_df['current_qty'].values
-
-                if len(X) > 1: # Need at least 2 points for linear regression
-                    model = LinearRegression()
-                    model.fit(X, y)
-
-                    # Project 30 days into the future
-                    last_day = sku_trend_df['days_since_epoch'].max()
-                    future_days = np.array(range(last_day + 1, last_day + 31)).reshape(-1, 1)
-                    future_predictions = model.predict(future_days)
-
-                    # Create a DataFrame for future predictions
-                    future_dates = [sku_trend_df['timestamp'].min() + datetime.timedelta(days=int(d)) for d in future_days]
-                    future_df = pd.DataFrame({'timestamp': future_dates, 'current_qty': future_predictions, 'type': 'Predicted'})
-                    sku_trend_df['type'] = 'Actual' # Add type for plotting
-
-                    combined_df = pd.concat([sku_trend_df[['timestamp', 'current_qty', 'type']], future_df])
-
-                    fig_forecast = px.line(combined_df, x='timestamp', y='current_qty', color='type',
-                                           title=f'Stock Level Forecast for SKU: {selected_sku_for_trend}',
-                                           labels={'current_qty': 'Quantity', 'timestamp': 'Date'},
-                                           color_discrete_map={'Actual': 'blue', 'Predicted': 'red'})
-                    st.plotly_chart(fig_forecast, use_container_width=True)
-                else:
-                    st.info("Not enough data points for forecasting. Need at least two transactions for this SKU.")
-            else:
-                st.info("Select an SKU with transaction data to view basic forecasting.")
-
-        else:
-            st.info("No transaction data available for analytics. Add/edit items in Inventory Management to generate transactions.")
+        analytics_panel(current_user_id)